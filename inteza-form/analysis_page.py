@@ -0,0 +1,320 @@
+import math
+from datetime import datetime, timedelta
+
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from config import DL_MACHINES, MACHINE_CODES_ALL, SECTION_ORDER, TIMESTAMP_FORMAT, ZL_MACHINES
+from excel_export import excel_download
+from perf_trace import span
+
+
+NG_PAGE_SIZES = [20, 50, 100]  # NG 圖每頁顯示幾項
+ANALYSIS_POLL_INTERVAL = 15  # 秒；自動更新時多久檢查一次是否有新資料
+NG_BAR_HEIGHT = 28  # 每一項在 NG 圖上的高度（px）
+
+
+def average_scores(stats):
+    """各機器 整體評分 的平均（score_sum / score_count）。"""
+    scores = stats[stats['項目'] == '整體評分'].groupby('機器代碼')[['score_sum', 'score_count']].sum()
+    return (scores['score_sum'] / scores['score_count'].where(scores['score_count'] > 0)).rename('整體評分')
+
+
+def ng_counts(stats):
+    ng = stats[stats['ng_count'] > 0]
+    return ng[['機器代碼', '區塊', '項目']].assign(NG次數=ng['ng_count']).reset_index(drop=True)
+
+
+def ng_item_index(stats, notes):
+    """以 項目｜機器代碼 為鍵的 NG 索引：NG 次數與 NG 列上去重後的備註。
+
+    依 NG次數、備註長度 由大到小排序。
+    """
+    ng = ng_counts(stats)
+    ng_index = ng.groupby(['項目', '機器代碼'], sort=False)['NG次數'].sum()
+    ng_notes = notes[notes['Pass/NG'] == 'NG']
+    ng_notes = ng_notes.groupby(['項目', '機器代碼'])['Note'].agg(lambda x: '; '.join(sorted(set(x))))
+    ng_agg = pd.DataFrame({
+        'NG次數': ng_index,
+        'Note': ng_notes.reindex(ng_index.index).fillna('')
+    }).reset_index()
+    ng_agg['項目_型號'] = ng_agg['項目'] + '｜' + ng_agg['機器代碼']
+    ng_agg['備註長度'] = ng_agg['Note'].str.len()
+    ng_agg = ng_agg[['項目_型號', 'NG次數', 'Note', '備註長度']]
+    return ng_agg.sort_values(['NG次數', '備註長度'], ascending=[False, False]).reset_index(drop=True)
+
+
+def build_analysis_summary(stats, notes, machines=MACHINE_CODES_ALL):
+    """由累計統計產生 分析工具 的總表（通過率、區塊總結 Note、總體評分、NG 次數）。
+
+    回傳欄位為 區塊、項目 與 machines 中的各機器代碼。
+    """
+    stats = stats[stats['機器代碼'].isin(machines)]
+    sec_stats = stats[stats['區塊'].isin(SECTION_ORDER)]
+    keys = ['區塊', '機器代碼']
+    parts = []
+
+    # 通過率：每個 (區塊, 機器代碼) 加總各項目的 Pass/NG 數量
+    counts = sec_stats.groupby(keys)[['pass_count', 'ng_count']].sum()
+    total = counts['pass_count'] + counts['ng_count']
+    pass_rate = (counts['pass_count'] / total * 100).where(total > 0)
+    parts.append(pd.DataFrame({
+        '項目': '通過率 (%)',
+        '值': pass_rate.map(lambda v: f"{v:.1f}%" if pd.notna(v) else 'N/A')
+    }).reset_index())
+
+    # 區塊總結 Note：依原始列順序串接「Note（測試者）」
+    notes = notes[(notes['項目'] == '區塊總結 Note') & notes['區塊'].isin(SECTION_ORDER)]
+    combined_notes = (notes['Note'] + '（' + notes['測試者'] + '）').groupby([notes['區塊'], notes['機器代碼']]).agg('; '.join)
+    parts.append(pd.DataFrame({
+        '項目': '區塊總結 Note',
+        '值': combined_notes.reindex(counts.index).fillna('無')
+    }).reset_index())
+
+    # 總體評分：所有機器都列出，沒有資料時為 N/A
+    avg_score = average_scores(stats).reindex(machines)
+    parts.append(pd.DataFrame({
+        '區塊': '整體評估',
+        '機器代碼': machines,
+        '項目': '總體評分',
+        '值': [f"{v:.1f}" if not pd.isna(v) else 'N/A' for v in avg_score]
+    }))
+
+    # NG 次數
+    ng_rows = ng_counts(stats)
+    parts.append(pd.DataFrame({
+        '區塊': 'NG：' + ng_rows['區塊'],
+        '機器代碼': ng_rows['機器代碼'],
+        '項目': ng_rows['項目'],
+        '值': ng_rows['NG次數'].astype(str) + ' 次'
+    }))
+
+    summary_df = pd.concat(parts, ignore_index=True)
+    final_df = summary_df.pivot(index=['區塊', '項目'], columns='機器代碼', values='值')
+    # 與原本 pivot_table 的輸出一致：機器欄位依代碼排序
+    final_df = final_df.reindex(columns=sorted(machines)).reset_index()
+    final_df.columns.name = None
+    ng_sections = sorted([s for s in final_df['區塊'].unique() if s.startswith('NG：')])
+    section_order_full = SECTION_ORDER + ng_sections
+    final_df['區塊'] = pd.Categorical(final_df['區塊'], categories=section_order_full, ordered=True)
+    return final_df.sort_values(['區塊', '項目']).reset_index(drop=True)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def analysis_tables(data_key, machines, _analysis_store, _filters):
+    """分析用的統計、Note、總表與平均分數，依 data_key（資料指紋、本機資料版本與篩選條件）快取；資料沒變時不重新彙總。"""
+    stats, notes = _analysis_store.load(_filters)
+    final_df = build_analysis_summary(stats, notes, list(machines))
+    avg_scores = average_scores(stats).dropna().reset_index()
+    return stats, notes, final_df, avg_scores
+
+
+@st.fragment(run_every=ANALYSIS_POLL_INTERVAL)
+def watch_for_changes(snapshots, analysis_store):
+    """定時檢查是否有新資料，有才重新整理整個分析頁；沒有時不讀取也不彙總。
+
+    同一個 process 內的儲存／匯入會直接讓 analysis_store.version 增加；
+    其他地方寫入的資料由快照的增量同步（每 SNAPSHOT_SYNC_INTERVAL 秒最多一次，只讀新增的列）發現。
+    """
+    try:
+        for snapshot in snapshots:
+            snapshot.sync()
+        analysis_store.update_all(snapshots)
+    except Exception:
+        return  # 暫時讀取失敗時，等下一次檢查
+    if analysis_store.version != st.session_state.get('analysis_seen_version'):
+        st.rerun()
+
+
+def render_filters(analysis_store):
+    """側邊欄的分析範圍篩選器；全部不篩選時回傳 None，直接使用預先算好的統計。"""
+    st.sidebar.markdown('### 🔎 分析範圍')
+    testers, first_ts, last_ts = analysis_store.filter_options()
+    filters = {}
+
+    if first_ts and st.sidebar.checkbox('限定日期範圍'):
+        last_day = datetime.strptime(last_ts, TIMESTAMP_FORMAT).date()
+        first_day = datetime.strptime(first_ts, TIMESTAMP_FORMAT).date()
+        date_range = st.sidebar.date_input(
+            '日期範圍',
+            value=(max(first_day, last_day - timedelta(days=13)), last_day),
+            min_value=first_day,
+            max_value=last_day
+        )
+        if len(date_range) == 2:
+            filters['start'], filters['end'] = date_range
+
+    series = st.sidebar.radio('系列', ['全部', 'ZL 系列', 'DL 系列'], horizontal=True)
+    series_machines = {'全部': MACHINE_CODES_ALL, 'ZL 系列': ZL_MACHINES, 'DL 系列': DL_MACHINES}[series]
+    picked_machines = st.sidebar.multiselect('機器（不選表示全部）', series_machines)
+    machines = picked_machines or series_machines
+    if machines != MACHINE_CODES_ALL:
+        filters['machines'] = machines
+
+    picked_testers = st.sidebar.multiselect('測試者（不選表示全部）', testers)
+    if picked_testers:
+        filters['testers'] = picked_testers
+
+    return filters or None, machines
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def score_figure(data_key, _avg_scores):
+    """總體評分排行榜（紅到綠），依 data_key（資料指紋、本機資料版本與篩選條件）快取。"""
+    fig_score = px.bar(
+        _avg_scores,
+        x='機器代碼',
+        y='整體評分',
+        title='⭐ 總體評分排行榜',
+        text='整體評分',  # 要顯示的數值
+        color='整體評分',
+        color_continuous_scale=['red', 'yellow', 'green']
+    )
+
+    # 文字放到柱狀圖上方 + 放大字體
+    fig_score.update_traces(
+        textposition='outside',
+        textfont_size=14
+    )
+
+    # 如果項目多，可以適當調整寬度、間距
+    fig_score.update_layout(
+        height=500,
+        bargap=0.2
+    )
+    return fig_score
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def ng_figure(data_key, section, page_size, page, _ng_page):
+    """NG 圖的一頁，依 (data_key, 區塊, 每頁筆數, 頁數) 快取；高度隨項目數調整。"""
+    # ✅ 保留原順序，不反轉（最多的會在 plotly 的最下方）
+    category_order = _ng_page['項目_型號'].tolist()
+
+    fig_ng = px.bar(
+        _ng_page,
+        x='NG次數',
+        y='項目_型號',
+        orientation='h',
+        title='❌ NG 項目（項目｜機器代碼，合併備註，按秩序排序）',
+        color='NG次數',
+        color_continuous_scale='Reds',
+        custom_data=['Note']
+    )
+
+    # 設定 hover 內容（圖上不顯示數值）
+    fig_ng.update_traces(
+        hovertemplate='%{y}<br>NG次數: %{x}<br>備註: %{customdata[0]}',
+        text=None
+    )
+
+    # 設定 y 軸順序、左側留空間
+    fig_ng.update_layout(
+        yaxis=dict(
+            categoryorder='array',
+            categoryarray=category_order,
+            automargin=True
+        ),
+        margin=dict(l=300, r=20, t=50, b=50),
+        height=max(300, NG_BAR_HEIGHT * len(_ng_page) + 120)
+    )
+    return fig_ng
+
+
+def reset_ng_page():
+    st.session_state.ng_page = 1
+
+
+@st.fragment
+def render_ng_chart(data_key, stats, notes):
+    """NG 圖：可依區塊下鑽並分頁，只送出目前這一頁；換頁只重跑這個區塊。"""
+    ng_sections = [s for s in SECTION_ORDER if (stats['區塊'].eq(s) & stats['ng_count'].gt(0)).any()]
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        section = st.selectbox('NG 區塊', ['全部區塊'] + ng_sections, key='ng_section', on_change=reset_ng_page)
+    with col2:
+        page_size = st.selectbox('每頁項數', NG_PAGE_SIZES, key='ng_page_size', on_change=reset_ng_page)
+
+    if section != '全部區塊':
+        stats = stats[stats['區塊'] == section]
+        notes = notes[notes['區塊'] == section]
+    # NG 項目索引：次數與備註都只來自 NG 列
+    ng_agg = ng_item_index(stats, notes)
+    if ng_agg.empty:
+        st.info('目前範圍內沒有 NG 項目')
+        return
+
+    pages = math.ceil(len(ng_agg) / page_size)
+    # 資料或篩選條件變動後頁數可能變少
+    if st.session_state.get('ng_page', 1) > pages:
+        st.session_state.ng_page = pages
+    with col3:
+        page = st.number_input(f'頁數（共 {pages} 頁）', min_value=1, max_value=pages, key='ng_page')
+    first = (page - 1) * page_size
+    ng_page = ng_agg.iloc[first:first + page_size]
+    st.caption(f'共 {len(ng_agg)} 項 NG，顯示第 {first + 1}–{first + len(ng_page)} 項')
+    st.plotly_chart(ng_figure(data_key, section, page_size, page, ng_page))
+
+
+def render(snapshots, analysis_store):
+    if st.sidebar.button('🔁 重新建立本機分析資料'):
+        with st.spinner('正在從 Google Sheet 重新建立本機分析資料...'):
+            analysis_store.rebuild(snapshots)
+    try:
+        for snapshot in snapshots:
+            snapshot.sync()
+        if not any(snapshot.header for snapshot in snapshots):
+            st.warning("⚠️ Google Sheet 尚無資料可分析。")
+            st.stop()
+        for snapshot in snapshots:
+            # 與 frame() 相同的欄名：多個空白欄位會各自改名，不算重複
+            header = snapshot.frame_columns()
+            if len(header) != len(set(header)):
+                st.error(f"❌ Google Sheet header 有重複值：{header}")
+                st.stop()
+        with span('更新本機統計'):
+            updated = analysis_store.update_all(snapshots)
+        if not updated:
+            st.warning("⚠️ Google Sheet 列數比已統計的少（可能有刪除資料），請按側邊欄「重新建立本機分析資料」。")
+    except Exception as e:
+        st.error(f"❌ Google Sheet 讀取失敗：{e}")
+        st.stop()
+
+    # 自上次查看後新增的評估
+    marks = analysis_store.row_counts()
+    last_marks = st.session_state.get('analysis_seen_marks')
+    if last_marks is not None and last_marks != marks:
+        new_submissions, new_machines = analysis_store.count_new_submissions(last_marks)
+        if new_submissions:
+            st.info(f'🆕 自上次查看後新增 {new_submissions} 台次評估（{new_machines} 台機器）')
+    st.session_state.analysis_seen_marks = marks
+    st.session_state.analysis_seen_version = analysis_store.version
+    if st.sidebar.toggle('🔄 有新資料時自動更新', value=True, key='analysis_auto_refresh'):
+        watch_for_changes(snapshots, analysis_store)
+
+    filters, machines = render_filters(analysis_store)
+    data_key = (tuple(snapshot.fingerprint() for snapshot in snapshots), analysis_store.version, repr(filters))
+    with span('分析彙總'):
+        stats, notes, final_df, avg_scores = analysis_tables(data_key, tuple(machines), analysis_store, filters)
+    if filters:
+        st.success(f"✅ 篩選後 {analysis_store.count_rows(filters)} 筆（共 {analysis_store.mirror_size()} 筆 Google Sheet 資料）")
+    else:
+        st.success(f"✅ 已統計 {analysis_store.mirror_size()} 筆 Google Sheet 資料！")
+
+    # ========== 視覺化部分 ==========
+    st.markdown("### 📊 分析結果預覽")
+    st.dataframe(final_df)
+
+    with span('Plotly 圖表'):
+        st.plotly_chart(score_figure(data_key, avg_scores))
+        render_ng_chart(data_key, stats, notes)
+
+    # 下載分析報告 Excel
+    excel_download(
+        '📥 下載分析報告 Excel',
+        '分析報告',
+        f'分析報告_INTEZA_{pd.Timestamp.now().strftime("%Y%m%d")}.xlsx',
+        data_key,
+        lambda: final_df
+    )
@@ -0,0 +1,392 @@
+"""離線效能測試：以記憶體中的假工作表取代 Google Sheet，量測資料量增加時 app 的表現，不消耗 Sheets 配額。
+
+    python benchmark.py                             # 1k / 10k / 100k / 1M 列
+    python benchmark.py --sizes 1000 10000 --latency 0.3
+    python benchmark.py --output bench.json         # 存成基準
+    python benchmark.py --baseline bench.json       # 與基準比較，變慢超過容許範圍時回傳非 0
+    python benchmark.py --imports-only              # 只檢查表單模式（import 時間、延遲載入、區塊 rerun），幾秒內完成
+
+每個資料量在獨立的子行程中執行，快取、背景執行緒與記憶體峰值互不影響。
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+
+from config import MACHINE_CODES_ALL, SHEET_COLUMNS, SHEET_NAME, TIMESTAMP_FORMAT, build_submission
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 resource，記憶體峰值不量測
+    resource = None
+
+
+# ===== 設定 =====
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(HERE, 'app.py')
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+# 秒；表單模式冷啟動時 app 自己的 import 上限（不含 streamlit／pandas），plotly 等回到這條路徑就會超過
+IMPORT_TIME_BUDGET = 0.3
+IMPORT_SAMPLES = 3  # import 時間取幾次的最小值
+IMPORT_BASE = 'streamlit, pandas'
+FORM_IMPORTS = 'excel_export, local_store, sheet_sync, write_queue, form_page'
+ANALYSIS_IMPORTS = FORM_IMPORTS + ', analysis_page'
+# 只有分析／匯出／匯入時才載入；表單模式跑完後不應出現在 sys.modules
+# （streamlit 本身在安裝了 plotly 時就會載入 plotly.graph_objects，因此檢查 plotly.express）
+LAZY_MODULES = ['plotly.express', 'xlsxwriter', 'openpyxl']
+# 秒；按下 Pass／NG 時只重跑該區塊的 fragment，單一區塊 rerun 的上限
+SECTION_RERUN_BUDGET = 0.05
+SECTION_SCRIPT = """
+import form_page
+from config import EVALUATION_SECTIONS
+section = next(iter(EVALUATION_SECTIONS))
+form_page.render_section(section, EVALUATION_SECTIONS[section])
+"""
+# 與基準比較時，低於這個差距（秒）的變化視為量測雜訊
+NOISE_FLOOR = 0.05
+METRICS = [
+    ('sheet_read', '讀取工作表'),
+    ('mirror_build', '建立鏡像'),
+    ('summary_build', '產生總表'),
+    ('analysis_build', '分析建立'),
+    ('save_flush', '儲存寫入'),
+    ('cold_start', '冷啟動'),
+    ('form_rerun', '表單 rerun'),
+    ('save_rerun', '儲存 rerun'),
+    ('analysis_first_run', '分析首次'),
+    ('analysis_rerun', '分析 rerun'),
+    ('peak_rss_mb', '記憶體 MB')
+]
+
+BENCH_TESTERS = ['Andy', 'Ben', 'Cathy', 'Doris', 'Eric', 'Fiona', 'Grace', 'Henry']
+BENCH_NOTES = ['', '', '', '', '', '座墊偏硬', '握把太粗', '調整卡卡的', '重量片不好拉', '動作很順暢', '軌跡偏向外側']
+
+
+# ===== 假工作表 =====
+class FakeWorksheet:
+    """gspread Worksheet 的記憶體替身，只實作 app 用到的呼叫。
+
+    每次呼叫都會等待 latency 秒模擬網路延遲，呼叫次數記在 calls。
+    """
+
+    def __init__(self, title, values=None, latency=0.0, cols=None):
+        self.title = title
+        self.values = [list(row) for row in values or []]
+        self.latency = latency
+        self.calls = {}
+        # 與 Google Sheet 相同，寫入超出欄數（格線）的範圍會失敗，需先 add_cols
+        self.col_count = cols or max([len(row) for row in self.values] + [26])
+
+    def _call(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        time.sleep(self.latency)
+
+    def get_all_values(self):
+        self._call('get_all_values')
+        return [list(row) for row in self.values]
+
+    def get_all_records(self):
+        self._call('get_all_records')
+        if not self.values:
+            return []
+        header = self.values[0]
+        return [dict(zip(header, row + [''] * (len(header) - len(row)))) for row in self.values[1:]]
+
+    def get(self, range_name):
+        """只支援 app 使用的 'A{列}:{欄}' 形式。"""
+        self._call('get')
+        start, end = range_name.split(':')
+        first_row, first_col = a1_to_rowcol(start)
+        _, last_col = a1_to_rowcol(f'{end}1')
+        return [row[first_col - 1:last_col] for row in self.values[first_row - 1:]]
+
+    def add_cols(self, cols):
+        self._call('add_cols')
+        self.col_count += cols
+
+    def update(self, values, range_name):
+        self._call('update')
+        first_row, first_col = a1_to_rowcol(range_name)
+        if first_col - 1 + max(len(row) for row in values) > self.col_count:
+            raise ValueError(f'{range_name} exceeds grid limits')
+        for offset, new_row in enumerate(values):
+            while len(self.values) < first_row + offset:
+                self.values.append([])
+            row = self.values[first_row - 1 + offset]
+            end = first_col - 1 + len(new_row)
+            row.extend([''] * (end - len(row)))
+            row[first_col - 1:end] = [sheet_value(v) for v in new_row]
+
+    def append_rows(self, values, value_input_option='RAW', insert_data_option=None, table_range=None):
+        self._call('append_rows')
+        start_row = len(self.values) + 1
+        self.values.extend([sheet_value(v) for v in row] for row in values)
+        width = max(len(row) for row in values)
+        end = rowcol_to_a1(len(self.values), width)
+        return {'updates': {'updatedRange': f"'{self.title}'!A{start_row}:{end}"}}
+
+
+def sheet_value(value):
+    """Google Sheet 讀回來的值都是字串，空值為空字串。"""
+    return '' if value is None else str(value)
+
+
+# ===== 測試資料 =====
+def generate_submission(rng, machine, tester, date_str):
+    """一台機器的一次提交，與表單一樣由 config.build_submission 組成，作答隨機產生。"""
+    submission_id = uuid.UUID(int=rng.getrandbits(128)).hex
+
+    def answer(section, question, kind):
+        if kind == 'score':
+            return 'N/A', '', rng.randint(1, 5)
+        if kind == 'summary':
+            return 'N/A', rng.choice(BENCH_NOTES), None
+        return rng.choices(['Pass', 'NG', '未選擇'], weights=[75, 20, 5])[0], rng.choice(BENCH_NOTES), None
+
+    return build_submission(tester, machine, date_str, submission_id, answer)
+
+
+def generate_rows(n_rows, seed=0):
+    """產生 n_rows 列 工作表1 的資料（不含標題列），15 台機器輪流被評估，時間依序遞增。"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 9)
+    rows = []
+    k = 0
+    while len(rows) < n_rows:
+        machine = MACHINE_CODES_ALL[k % len(MACHINE_CODES_ALL)]
+        date_str = (start + timedelta(minutes=7 * k)).strftime(TIMESTAMP_FORMAT)
+        records = generate_submission(rng, machine, rng.choice(BENCH_TESTERS), date_str)
+        rows.extend([sheet_value(r[col]) for col in SHEET_COLUMNS] for r in records)
+        k += 1
+    return rows[:n_rows]
+
+
+# ===== 量測 =====
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def click(at, label):
+    next(b for b in at.button if b.label == label).click()
+    at.run()
+    if at.exception:
+        raise RuntimeError(f'{label}：{at.exception}')
+
+
+def median_rerun(at, reruns):
+    return statistics.median(timed(at.run)[0] for _ in range(reruns))
+
+
+def run_size(n_rows, latency, reruns):
+    """在目前行程中量測一個資料量；由 main 以子行程呼叫。"""
+    import local_store
+    import sheet_sync
+    import write_queue
+    from analysis_page import build_analysis_summary
+    from streamlit.testing.v1 import AppTest
+
+    workdir = tempfile.mkdtemp(prefix='inteza-bench-')
+    local_store.ANALYSIS_STORE_PATH = os.path.join(workdir, 'analysis_store.db')
+    write_queue.JOURNAL_PATH = os.path.join(workdir, 'submission_journal.db')
+    ws = FakeWorksheet(SHEET_NAME, [SHEET_COLUMNS] + generate_rows(n_rows), latency)
+    sheet_sync.get_sheet_handles = lambda: (None, None, ws, None, None)
+    result = {'rows': n_rows}
+
+    # 分析資料建立：讀取整張表 → 建立本機鏡像與統計 → 產生總表
+    snapshot = sheet_sync.SheetSnapshot(ws)
+    store = local_store.AnalysisStore(local_store.ANALYSIS_STORE_PATH)
+    result['sheet_read'], _ = timed(snapshot.sync)
+    result['mirror_build'], _ = timed(lambda: store.update_from(snapshot))
+    result['summary_build'], _ = timed(lambda: build_analysis_summary(*store.load()))
+    result['analysis_build'] = result['sheet_read'] + result['mirror_build'] + result['summary_build']
+
+    # 儲存：背景佇列 flush 一台機器的工作（append 寫入 + 更新統計）
+    records = generate_submission(random.Random(n_rows), MACHINE_CODES_ALL[0], 'Benchmark',
+                                  datetime.now().strftime(TIMESTAMP_FORMAT))
+    batch = [(records[0]['提交ID'], records)]
+    result['save_flush'], _ = timed(lambda: (sheet_sync.append_submissions(snapshot, batch), store.update_from(snapshot)))
+
+    # 整個 app：冷啟動、表單 rerun、按下儲存、分析頁
+    at = AppTest.from_file(APP_PATH, default_timeout=3600)
+    result['cold_start'], _ = timed(at.run)
+    if at.exception:
+        raise RuntimeError(f'冷啟動：{at.exception}')
+    at.text_input[0].input('Benchmark')
+    click(at, '✅ 確認提交姓名')
+    click(at, '✅ 確認系列')
+    result['form_rerun'] = median_rerun(at, reruns)
+    next(b for b in at.button if b.label == '✅ Pass').click()
+    at.run()
+    next(b for b in at.button if b.label == '✅ 完成本機台並儲存，進入下一台').click()
+    result['save_rerun'], _ = timed(at.run)
+    at.sidebar.selectbox[0].select('分析工具')
+    result['analysis_first_run'], _ = timed(at.run)
+    if at.exception:
+        raise RuntimeError(f'分析工具：{at.exception}')
+    result['analysis_rerun'] = median_rerun(at, reruns)
+
+    if resource is not None:
+        # Linux 的 ru_maxrss 單位為 KB，macOS 為 bytes
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    result['api_calls'] = ws.calls
+    return result
+
+
+def measure_import_time(modules):
+    """在全新的 Python 行程中先 import streamlit／pandas，再量測 modules 的 import 時間（秒，取最小值）。"""
+    code = f'import time, {IMPORT_BASE}; t = time.perf_counter(); import {modules}; print(time.perf_counter() - t)'
+    samples = []
+    for _ in range(IMPORT_SAMPLES):
+        out = subprocess.run([sys.executable, '-c', code], cwd=HERE, capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.split()[-1]))
+    return min(samples)
+
+
+def form_mode_checks(reruns):
+    """在目前（全新的）行程中以 AppTest 跑表單模式到第一台機器，回傳被提早載入的 LAZY_MODULES，
+    以及單獨一個區塊（render_section）按下 Pass／NG 後 rerun 的中位數時間。
+
+    不替換 Google Sheet 連線：表單模式本來就不應連線。
+    """
+    import local_store
+    import write_queue
+    from streamlit.testing.v1 import AppTest
+
+    workdir = tempfile.mkdtemp(prefix='inteza-bench-')
+    local_store.ANALYSIS_STORE_PATH = os.path.join(workdir, 'analysis_store.db')
+    write_queue.JOURNAL_PATH = os.path.join(workdir, 'submission_journal.db')
+    at = AppTest.from_file(APP_PATH, default_timeout=600).run()
+    if at.exception:
+        raise RuntimeError(f'冷啟動：{at.exception}')
+    at.text_input[0].input('Benchmark')
+    click(at, '✅ 確認提交姓名')
+    click(at, '✅ 確認系列')
+    eager = [name for name in LAZY_MODULES if name in sys.modules]
+
+    # fragment rerun 只執行該區塊的函式，以只含一個區塊的腳本量測
+    section = AppTest.from_string(SECTION_SCRIPT, default_timeout=600)
+    section.run()
+    times = []
+    for i in range(reruns):
+        section.button[i % len(section.button)].click()
+        times.append(timed(section.run)[0])
+    return {'eager_modules': eager, 'section_rerun': statistics.median(times)}
+
+
+def check_form_mode(reruns):
+    """表單模式的 import 時間、延遲載入與區塊 rerun 檢查，回傳 (結果, 失敗訊息)。"""
+    out = subprocess.run(
+        [sys.executable, __file__, '--form-child', '--reruns', str(reruns)], cwd=HERE, capture_output=True, text=True
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f'表單模式檢查失敗：\n{out.stderr}')
+    results = {
+        'import_form': measure_import_time(FORM_IMPORTS),
+        'import_analysis': measure_import_time(ANALYSIS_IMPORTS),
+        **json.loads(out.stdout.strip().splitlines()[-1])
+    }
+    failures = []
+    if results['import_form'] > IMPORT_TIME_BUDGET:
+        failures.append(f"表單模式 import {results['import_form']:.2f}s 超過上限 {IMPORT_TIME_BUDGET:.2f}s")
+    if results['eager_modules']:
+        failures.append(f"表單模式提早載入了 {', '.join(results['eager_modules'])}")
+    if results['section_rerun'] > SECTION_RERUN_BUDGET:
+        failures.append(f"區塊 rerun {results['section_rerun'] * 1000:.0f} ms 超過上限 {SECTION_RERUN_BUDGET * 1000:.0f} ms")
+    return results, failures
+
+
+def run_child(n_rows, latency, reruns):
+    out = subprocess.run(
+        [sys.executable, __file__, '--child', str(n_rows), '--latency', str(latency), '--reruns', str(reruns)],
+        cwd=HERE, capture_output=True, text=True
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f'{n_rows} 列的測試失敗：\n{out.stderr}')
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """回傳比基準慢（或記憶體多）超過 tolerance 的項目。"""
+    regressions = []
+    base_sizes = {r['rows']: r for r in baseline.get('sizes', [])}
+    for current in results['sizes']:
+        base = base_sizes.get(current['rows'])
+        if base is None:
+            continue
+        for key, label in METRICS:
+            if key not in current or key not in base:
+                continue
+            floor = 0 if key == 'peak_rss_mb' else NOISE_FLOOR
+            if current[key] > base[key] * (1 + tolerance) and current[key] - base[key] > floor:
+                regressions.append(f"{current['rows']:,} 列 {label}：{base[key]:.3f} → {current[key]:.3f}")
+    for key in ('import_form', 'import_analysis', 'section_rerun'):
+        if key in baseline and results[key] > baseline[key] * (1 + tolerance) + NOISE_FLOOR:
+            regressions.append(f'{key}：{baseline[key]:.3f} → {results[key]:.3f}')
+    return regressions
+
+
+def print_report(results):
+    print(f"import（表單）{results['import_form']:.2f}s｜import（分析）{results['import_analysis']:.2f}s"
+          f"｜上限 {IMPORT_TIME_BUDGET:.2f}s｜表單模式提早載入：{', '.join(results['eager_modules']) or '無'}")
+    print(f"區塊 rerun {results['section_rerun'] * 1000:.0f} ms｜上限 {SECTION_RERUN_BUDGET * 1000:.0f} ms")
+    if not results['sizes']:
+        return
+    print('列數'.rjust(10) + ''.join(label.rjust(12) for _, label in METRICS))
+    for r in results['sizes']:
+        cells = [f'{r[key]:.3f}' if key in r else '-' for key, _ in METRICS]
+        print(f"{r['rows']:>10,}" + ''.join(cell.rjust(12) for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='INTEZA 人因評估系統離線效能測試')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='要測試的 工作表1 列數')
+    parser.add_argument('--latency', type=float, default=0.0, help='每次模擬 API 呼叫的延遲（秒）')
+    parser.add_argument('--reruns', type=int, default=5, help='rerun 時間取幾次的中位數')
+    parser.add_argument('--output', help='把結果存成 JSON')
+    parser.add_argument('--baseline', help='與先前存下的 JSON 比較')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='容許比基準慢的比例')
+    parser.add_argument('--imports-only', action='store_true', help='只檢查表單模式，不跑各資料量')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--form-child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_size(args.child, args.latency, args.reruns)))
+        return
+    if args.form_child:
+        print(json.dumps(form_mode_checks(args.reruns)))
+        return
+
+    form_results, failures = check_form_mode(args.reruns)
+    results = {'latency': args.latency, **form_results, 'sizes': []}
+    for n_rows in [] if args.imports_only else args.sizes:
+        print(f'⏱️ {n_rows:,} 列...', file=sys.stderr)
+        results['sizes'].append(run_child(n_rows, args.latency, args.reruns))
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            failures += compare(results, json.load(f), args.tolerance)
+    for failure in failures:
+        print(f'❌ {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
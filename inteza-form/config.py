@@ -0,0 +1,76 @@
+# ===== 基本設定 =====
+SHEET_ID = '1IVwbN6BYAZKOsUy8XHVbrIGwzN_ptzsSZPUoVWKMcq0'
+SHEET_NAME = '工作表1'
+ANALYSIS_SHEET_NAME = '分析報告'
+WIDE_SHEET_NAME = '評估紀錄'
+# 儲存格式：'long' 每題一列寫入 工作表1；'wide' 每台機器一列寫入 WIDE_SHEET_NAME
+STORAGE_MODE = 'long'
+scope = ['https://www.googleapis.com/auth/spreadsheets']
+
+SHEET_COLUMNS = ['測試者', '機器代碼', '區塊', '項目', 'Pass/NG', 'Note', '分數', '日期時間', '提交ID']
+SUBMISSION_ID_COLUMN = '提交ID'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'  # 日期時間 欄位的格式
+
+ZL_MACHINES = ['ZL-01', 'ZL-02', 'ZL-03', 'ZL-04', 'ZL-05', 'ZL-07', 'ZL-08', 'ZL-09', 'ZL-10', 'ZL-11']
+DL_MACHINES = ['DL-03', 'DL-04', 'DL-05', 'DL-10', 'DL-13']
+
+FIBO_QUESTIONS = {
+    'DL-03': ['覺得整體重量會太輕嗎？'],
+    'DL-04': ['覺得輕的好還是重的好？'],
+    'ZL-01': ['座椅目前夠低嗎？'],
+    'ZL-02': ['椅背會太低嗎？'],
+    'ZL-07': ['腰帶會很不舒服嗎？'],
+    'ZL-08': ['會覺得很難上機嗎？'],
+    'ZL-09': ['壓腿滾筒會不會太硬很不舒服？']
+}
+
+EVALUATION_SECTIONS = {
+    '觸感體驗': ['座位調整重量片是否方便？', '整體動作是否穩定有質感？', '承靠部位是否舒適？', '抓握部分是否符合手感？'],
+    '人因調整': ['把手調整是否容易？', '承靠墊位置是否符合需求？', '坐墊位置是否調整方便？', '握把／踏板位置與角度是否符合需求？', '使用時關節是否可對齊軸點？'],
+    '力線評估': ['起始重量是否恰當？', '動作過程中重量變化是否流暢？'],
+    '運動軌跡': ['是否能完成全行程訓練？', '關節活動角度是否自然？', '運動軌跡是否能完全刺激目標肌群？'],
+    '心理感受': ['使用後的滿意度如何？', '是否有願意推薦給他人的意願？'],
+    '價值感受': ['你認為我們品牌在傳遞什麼形象？', '你估算這台機器價值多少？']
+}
+
+SECTION_ORDER = list(EVALUATION_SECTIONS.keys()) + ['Fibo問題追蹤', '整體評估']
+MACHINE_CODES_ALL = ZL_MACHINES + DL_MACHINES
+
+
+# ===== 一次提交的題目與列 =====
+def submission_items(machine=None):
+    """一台機器一次提交的題目 [(區塊, 項目, 類型, 題目原文)]，順序即寫入 工作表1 的順序。
+
+    類型為 'question'（Pass/NG＋Note）、'summary'（區塊總結 Note）、'fibo'（Fibo問題）或 'score'（整體評分）；
+    machine 為 None 時列出所有機器的 Fibo 題目（寬表欄位用）。
+    """
+    items = []
+    for section, questions in EVALUATION_SECTIONS.items():
+        items += [(section, q, 'question', q) for q in questions]
+        items.append((section, '區塊總結 Note', 'summary', None))
+    if machine is None:
+        fibo = dict.fromkeys(q for questions in FIBO_QUESTIONS.values() for q in questions)
+    else:
+        fibo = FIBO_QUESTIONS.get(machine, [])
+    items += [('Fibo問題追蹤', f'{q} （Fibo問題）', 'fibo', q) for q in fibo]
+    items.append(('整體評估', '整體評分', 'score', None))
+    return items
+
+
+def build_submission(tester, machine, date_str, submission_id, answer):
+    """依 submission_items 組成一台機器要寫入的 records；answer(區塊, 題目原文, 類型) 回傳 (Pass/NG, Note, 分數)。"""
+    records = []
+    for section, item, kind, question in submission_items(machine):
+        result, note, score = answer(section, question, kind)
+        records.append({
+            '測試者': tester,
+            '機器代碼': machine,
+            '區塊': section,
+            '項目': item,
+            'Pass/NG': result,
+            'Note': note,
+            '分數': score,
+            '日期時間': date_str,
+            '提交ID': submission_id
+        })
+    return records
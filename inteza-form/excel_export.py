@@ -0,0 +1,68 @@
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+import streamlit as st
+
+from config import TIMESTAMP_FORMAT
+from perf_trace import span
+
+
+# ===== Excel 匯出 =====
+EXPORT_HEADER_FORMAT = {'bold': True, 'bg_color': '#4CAF50', 'font_color': 'white', 'align': 'center'}
+
+
+def _excel_cell(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value
+
+
+@st.cache_data(max_entries=8, show_spinner='正在產生 Excel...')
+def build_excel(fingerprint, sheet_name, _load_df):
+    """共用的 Excel 匯出引擎，結果依 (fingerprint, sheet_name) 快取。
+
+    _load_df 只在快取未命中時才呼叫，命中時不會讀取資料。
+    使用 xlsxwriter 的 constant_memory 模式逐列寫出，不會在記憶體中多留一份完整資料。
+    """
+    import xlsxwriter  # 只有實際匯出時才載入
+
+    _df = _load_df()
+    output = BytesIO()
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet_xl = workbook.add_worksheet(sheet_name)
+    header_format = workbook.add_format(EXPORT_HEADER_FORMAT)
+    worksheet_xl.set_column(0, max(len(_df.columns) - 1, 0), 20)
+    worksheet_xl.freeze_panes(1, 0)
+    worksheet_xl.write_row(0, 0, [str(c) for c in _df.columns], header_format)
+    for row_num, row in enumerate(_df.itertuples(index=False, name=None), start=1):
+        for col_num, value in enumerate(row):
+            value = _excel_cell(value)
+            if value is not None:
+                worksheet_xl.write(row_num, col_num, value)
+    workbook.close()
+    return output.getvalue()
+
+
+def excel_download(label, sheet_name, file_name, fingerprint, load_df):
+    """側邊欄下載按鈕：按下「準備」後才讀取資料並產生 Excel。
+
+    準備好的檔案只對應按下當時的 fingerprint；資料更新或下載後恢復成「準備」按鈕，
+    之後的 rerun 不會再讀取資料與產生 Excel。
+    """
+    requested_key = f'export_requested_{sheet_name}'
+    if st.session_state.get(requested_key) != fingerprint:
+        if not st.sidebar.button(label, key=f'export_prepare_{sheet_name}'):
+            return
+        st.session_state[requested_key] = fingerprint
+    with span(f'Excel：{sheet_name}'):
+        data = build_excel(fingerprint, sheet_name, load_df)
+    st.sidebar.download_button(
+        f'⬇️ {label}',
+        data,
+        file_name=file_name,
+        key=f'export_download_{sheet_name}',
+        on_click=lambda: st.session_state.pop(requested_key, None)
+    )
@@ -0,0 +1,155 @@
+import uuid
+from datetime import datetime
+
+import streamlit as st
+
+from config import DL_MACHINES, EVALUATION_SECTIONS, FIBO_QUESTIONS, TIMESTAMP_FORMAT, ZL_MACHINES, build_submission
+from perf_trace import span
+
+
+def render_choice(key_prefix, label):
+    """一題的 Pass／NG 按鈕與目前選擇，結果存在 st.session_state[f'{key_prefix}_result']。"""
+    key_result = f'{key_prefix}_result'
+
+    # 這裡不再主動設定 st.session_state[key_result] = None
+    st.markdown(f"**{label}**")
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button('✅ Pass', key=f'{key_prefix}_pass'):
+            st.session_state[key_result] = 'Pass'
+    with col2:
+        if st.button('❌ NG', key=f'{key_prefix}_ng'):
+            st.session_state[key_result] = 'NG'
+
+    current_selection = st.session_state.get(key_result)
+    if current_selection:
+        st.write(f"👉 已選擇：**{current_selection}**")
+
+
+@st.fragment
+def render_section(section, items):
+    st.subheader(f'🔹 {section}')
+    section_notes = []
+
+    for item in items:
+        render_choice(f'{section}_{item}', item)
+        note = st.text_input(f'{item} Note', key=f'{section}_{item}_note', value='')
+        if note.strip() != '':
+            section_notes.append(f'{item}: {note}')
+
+    combined_note = '; '.join(section_notes)
+    st.text_area(
+        f'💬 {section} 區塊總結 Note（以下為細項 Note 整理供參考）\n{combined_note}',
+        key=f'{section}_summary_note',
+        value=''
+    )
+
+
+@st.fragment
+def render_fibo(machine):
+    st.subheader('🔹 Fibo問題追蹤')
+    for item in FIBO_QUESTIONS[machine]:
+        display_item = f'{item} （Fibo問題）'
+        # 這裡同樣不主動設定 None
+        render_choice(f'Fibo_{item}', display_item)
+        st.text_input(f'{display_item} Note', key=f'Fibo_{item}_note', value='')
+
+
+def collect_records(machine, submission_id, score):
+    """儲存時一次從 session state 讀出整台機器的作答，組成要寫入的列。"""
+    state = st.session_state
+
+    def answer(section, question, kind):
+        if kind == 'question':
+            return state.get(f'{section}_{question}_result') or '未選擇', state.get(f'{section}_{question}_note', ''), None
+        if kind == 'summary':
+            return 'N/A', state.get(f'{section}_summary_note', ''), None
+        if kind == 'fibo':
+            return state.get(f'Fibo_{question}_result') or '未選擇', state.get(f'Fibo_{question}_note', ''), None
+        return 'N/A', '', score
+
+    date_str = datetime.now().strftime(TIMESTAMP_FORMAT)
+    return build_submission(state.tester_name, machine, date_str, submission_id, answer)
+
+
+def first_pending_index(series, records):
+    """系列中第一台尚未完成的機器位置；全部完成時回傳系列長度（顯示填寫完成）。"""
+    machines = ZL_MACHINES if series == 'ZL 系列' else DL_MACHINES
+    completed = {r['機器代碼'] for r in records}
+    return next((i for i, m in enumerate(machines) if m not in completed), len(machines))
+
+
+def render(current_machine, write_queue):
+    all_machines = ZL_MACHINES + DL_MACHINES
+    completed_machines = sorted(set([r['機器代碼'] for r in st.session_state.records]), key=lambda x: all_machines.index(x))
+
+    if st.session_state.tester_name == '':
+        tester_input = st.text_input('請輸入測試者姓名')
+        if st.button('✅ 確認提交姓名'):
+            if tester_input.strip() != '':
+                st.session_state.tester_name = tester_input.strip()
+                # 瀏覽器重新整理或 server 重啟後，從 journal 還原今天已完成的機台
+                today_start = datetime.combine(datetime.now().date(), datetime.min.time()).timestamp()
+                st.session_state.records = write_queue.records_for(st.session_state.tester_name, today_start)
+                if st.session_state.selected_series:
+                    st.session_state.current_machine_index = first_pending_index(
+                        st.session_state.selected_series, st.session_state.records
+                    )
+                st.rerun()
+            else:
+                st.warning('請先輸入姓名再提交')
+        st.stop()
+    else:
+        if st.button('🔄 重新輸入姓名'):
+            st.session_state.tester_name = ''
+            st.session_state.selected_series = None
+            st.session_state.current_machine_index = 0
+            st.rerun()
+
+    if st.session_state.selected_series is None:
+        series_choice = st.radio('請選擇要開始的系列', ['ZL 系列', 'DL 系列'])
+        if st.button('✅ 確認系列'):
+            st.session_state.selected_series = series_choice
+            # 從還原的紀錄中跳過已完成的機台
+            st.session_state.current_machine_index = first_pending_index(series_choice, st.session_state.records)
+            st.rerun()
+        st.stop()
+
+    if current_machine is None:
+        st.success(f'🎉 {st.session_state.selected_series} 填寫完成！請至側邊欄下載資料或選擇另一系列繼續填寫')
+        if st.sidebar.button('🔄 切換系列／重新開始'):
+            st.session_state.selected_series = None
+            st.session_state.current_machine_index = 0
+            st.rerun()
+
+    else:
+        # 每台機器一個提交ID，儲存失敗重試時沿用同一個 ID 以避免重複寫入
+        submission_key = f'submission_id_{current_machine}'
+        if submission_key not in st.session_state:
+            st.session_state[submission_key] = uuid.uuid4().hex
+        submission_id = st.session_state[submission_key]
+
+        # 每個區塊是獨立的 fragment：按 Pass/NG 或輸入 Note 只會重跑該區塊
+        for section, items in EVALUATION_SECTIONS.items():
+            render_section(section, items)
+
+        if current_machine in FIBO_QUESTIONS:
+            render_fibo(current_machine)
+
+        score = st.radio('⭐ 整體評分（1~5分）', [1, 2, 3, 4, 5], index=2)
+
+        if st.button('✅ 完成本機台並儲存，進入下一台'):
+            with span('儲存到上傳佇列'):
+                data_list = collect_records(current_machine, submission_id, score)
+                write_queue.enqueue(data_list, submission_id)
+            st.session_state.records.extend(data_list)
+            st.session_state.pop(submission_key, None)
+
+            # 強化版清理：只要 key 名含有 _result、_note、_summary_note 就刪掉
+            for key in list(st.session_state.keys()):
+                if '_result' in key or '_note' in key or '_summary_note' in key:
+                    del st.session_state[key]
+
+            st.session_state.current_machine_index += 1
+            st.success("已加入上傳佇列，正在切換到下一台...")
+            st.rerun()
@@ -0,0 +1,194 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+import streamlit as st
+
+from config import MACHINE_CODES_ALL, SHEET_COLUMNS, SUBMISSION_ID_COLUMN, TIMESTAMP_FORMAT, submission_items
+from perf_trace import span
+from sheet_sync import append_submissions, get_write_snapshot
+
+
+# ===== 匯入離線 Session 資料 =====
+IMPORT_WORKERS = 4  # 同時解析幾個檔案
+IMPORT_KEY_COLUMNS = ['測試者', '機器代碼', '日期時間']  # 判斷機台是否已在 工作表1 的鍵
+IMPORT_RESULTS = {'Pass', 'NG', '未選擇', 'N/A'}
+
+
+def expected_items(machine):
+    """一台機器一次提交應有的 (區塊, 項目)，順序與表單寫入的相同。"""
+    return [(section, item) for section, item, _, _ in submission_items(machine)]
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def validate_submission(key, rows):
+    """檢查一台機器的列是否符合 EVALUATION_SECTIONS／FIBO_QUESTIONS，回傳錯誤訊息清單。"""
+    tester, machine, date_str = key
+    if machine not in MACHINE_CODES_ALL:
+        return [f'未知的機器代碼 {machine}']
+    errors = []
+    if not tester:
+        errors.append('缺少測試者')
+    try:
+        datetime.strptime(date_str, TIMESTAMP_FORMAT)
+    except ValueError:
+        errors.append(f'日期時間格式錯誤：{date_str or "（空白）"}')
+
+    expected = expected_items(machine)
+    found = [(r['區塊'], r['項目']) for _, r in rows]
+    missing = [f'{s}／{i}' for s, i in expected if (s, i) not in found]
+    extra = [f'{s}／{i}' for s, i in dict.fromkeys(found) if (s, i) not in expected]
+    if missing:
+        errors.append(f'缺少 {len(missing)} 題：{"、".join(missing[:3])}{"…" if len(missing) > 3 else ""}')
+    if extra:
+        errors.append(f'不在題目中：{"、".join(extra[:3])}{"…" if len(extra) > 3 else ""}')
+    if len(found) != len(set(found)):
+        errors.append('題目重複')
+
+    for row_no, r in rows:
+        if r['Pass/NG'] not in IMPORT_RESULTS:
+            errors.append(f'第 {row_no} 列 Pass/NG 不正確：{r["Pass/NG"]}')
+        if r['項目'] == '整體評分' and r['分數'] not in (1, 2, 3, 4, 5):
+            errors.append(f'第 {row_no} 列 整體評分 不是 1~5：{r["分數"]}')
+    return errors
+
+
+def parse_session_file(name, data):
+    """解析一個 Session 匯出檔，回傳 ([(提交ID, records), ...], 錯誤訊息)；有問題的機台整台略過。"""
+    from openpyxl import load_workbook  # 只有匯入時才載入
+
+    try:
+        workbook = load_workbook(BytesIO(data), read_only=True, data_only=True)
+        rows = list(workbook.worksheets[0].iter_rows(values_only=True))
+        workbook.close()
+    except Exception as e:
+        return [], [f'{name}：無法讀取（{e}）']
+    if not rows:
+        return [], [f'{name}：沒有資料']
+
+    header = [_cell_text(c) for c in rows[0]]
+    missing = [c for c in SHEET_COLUMNS if c not in header and c != SUBMISSION_ID_COLUMN]
+    if missing:
+        return [], [f'{name}：缺少欄位 {"、".join(missing)}']
+
+    groups = {}
+    for row_no, row in enumerate(rows[1:], start=2):
+        values = dict(zip(header, row))
+        record = {c: _cell_text(values.get(c)) for c in SHEET_COLUMNS}
+        if not any(record.values()):
+            continue
+        # 分數轉成數字；非整數（例如 3.5）保留原值，由 validate_submission 判定為錯誤，不會被截斷後匯入
+        score = record['分數']
+        try:
+            score = float(score) if score else None
+        except ValueError:
+            pass
+        record['分數'] = int(score) if isinstance(score, float) and score.is_integer() else score
+        groups.setdefault(tuple(record[c] for c in IMPORT_KEY_COLUMNS), []).append((row_no, record))
+
+    submissions = []
+    errors = []
+    for key, rows in groups.items():
+        problems = validate_submission(key, rows)
+        if problems:
+            errors.append(f'{name}：{key[0]}／{key[1]}／{key[2]}：{"；".join(problems)}')
+            continue
+        # 舊版匯出沒有提交ID：由 測試者＋機器＋時間 產生固定的 ID，重複匯入時仍可去重
+        ids = {r[SUBMISSION_ID_COLUMN] for _, r in rows}
+        submission_id = ids.pop() if len(ids) == 1 and '' not in ids else uuid.uuid5(uuid.NAMESPACE_URL, '|'.join(key)).hex
+        order = {item: i for i, item in enumerate(expected_items(key[1]))}
+        records = sorted((r for _, r in rows), key=lambda r: order[(r['區塊'], r['項目'])])
+        for r in records:
+            r[SUBMISSION_ID_COLUMN] = submission_id
+        submissions.append((submission_id, records))
+    return submissions, errors
+
+
+@st.cache_data(max_entries=2, show_spinner='正在解析 Excel...')
+def parse_uploads(files):
+    """以 thread pool 同時解析多個檔案；files 為 ((檔名, bytes), ...)。"""
+    with ThreadPoolExecutor(max_workers=min(IMPORT_WORKERS, len(files))) as pool:
+        results = list(pool.map(lambda f: parse_session_file(*f), files))
+    submissions = [s for subs, _ in results for s in subs]
+    errors = [e for _, errs in results for e in errs]
+    return submissions, errors
+
+
+def existing_keys(snapshots):
+    keys = set()
+    for snapshot in snapshots:
+        if not all(c in snapshot.header for c in IMPORT_KEY_COLUMNS):
+            continue
+        idx = [snapshot.header.index(c) for c in IMPORT_KEY_COLUMNS]
+        keys.update(tuple(row[i] for i in idx) for row in snapshot.rows)
+    return keys
+
+
+def new_submissions(submissions, keys):
+    """去掉已在 工作表1 的機台（依 測試者＋機器代碼＋日期時間），以及多個檔案中重複的機台。"""
+    keys = set(keys)
+    batch = []
+    for submission_id, records in submissions:
+        key = tuple(records[0][c] for c in IMPORT_KEY_COLUMNS)
+        if key not in keys:
+            keys.add(key)
+            batch.append((submission_id, records))
+    return batch
+
+
+def render(snapshots, analysis_store):
+    st.markdown('### 📂 匯入離線 Session 資料')
+    uploads = st.file_uploader(
+        '選擇以「💾 下載目前測試者資料 (Session)」匯出的 Excel 檔（可一次選多個）',
+        type='xlsx',
+        accept_multiple_files=True
+    )
+    if not uploads:
+        return
+
+    with span('解析 Session 檔'):
+        submissions, errors = parse_uploads(tuple((f.name, f.getvalue()) for f in uploads))
+    if errors:
+        with st.expander(f'⚠️ {len(errors)} 台次有問題，不會匯入', expanded=True):
+            for error in errors:
+                st.write(f'- {error}')
+
+    try:
+        for snapshot in snapshots:
+            snapshot.sync()
+    except Exception as e:
+        st.error(f"❌ Google Sheet 讀取失敗：{e}")
+        st.stop()
+    batch = new_submissions(submissions, existing_keys(snapshots))
+    st.info(f'共 {len(submissions)} 台次，{len(submissions) - len(batch)} 台次已存在或重複，{len(batch)} 台次待匯入')
+    if not batch:
+        return
+
+    st.dataframe(pd.DataFrame(
+        [{**{c: records[0][c] for c in IMPORT_KEY_COLUMNS}, '列數': len(records)} for _, records in batch]
+    ))
+    row_count = sum(len(records) for _, records in batch)
+    if st.button(f'📤 匯入 {len(batch)} 台次（{row_count} 列）到 Google Sheet'):
+        write_snapshot = get_write_snapshot()
+        try:
+            with st.spinner('正在寫入 Google Sheet...'), span('批次寫入'):
+                # 寫入前強制同步一次，避免與其他人剛上傳的資料重複
+                for snapshot in snapshots:
+                    snapshot.sync(force=True)
+                written = append_submissions(write_snapshot, new_submissions(batch, existing_keys(snapshots)))
+                analysis_store.update_from(write_snapshot)
+        except Exception as e:
+            st.error(f"❌ 寫入 Google Sheet 失敗：{e}")
+            st.stop()
+        st.success(f'✅ 已匯入 {len(written)} 台次')
@@ -0,0 +1,369 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import closing
+from datetime import timedelta
+
+import pandas as pd
+import streamlit as st
+
+from config import TIMESTAMP_FORMAT
+from wide_format import WIDE_ROW_OFFSET, WIDE_ROW_STRIDE
+
+
+# ===== 本機分析資料庫（工作表1 鏡像＋增量統計） =====
+ANALYSIS_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analysis_store.db')
+STATS_KEYS = ['機器代碼', '區塊', '項目']
+# 工作表欄位 -> 鏡像資料表欄位
+MIRROR_COLUMNS = {
+    '測試者': 'tester', '機器代碼': 'machine', '區塊': 'section', '項目': 'item', 'Pass/NG': 'result',
+    'Note': 'note', '分數': 'score', '日期時間': 'ts', '提交ID': 'submission_id'
+}
+CATEGORY_COLUMNS = ['測試者', '機器代碼', '區塊', '項目', 'Pass/NG']
+# 各來源工作表已處理列數在 meta 表中的鍵
+ROW_COUNT_KEYS = {'long': 'row_count', 'wide': 'row_count_wide'}
+# meta 表中表示 Note 詞索引已建立的鍵（舊的資料庫第一次開啟時會由 item_notes 補建）
+NOTE_INDEX_KEY = 'note_index'
+# Note 斷詞：中文取相鄰兩字，含有這些字的兩字組不列入索引
+TERM_STOP_CHARS = set('的了是也都就還和與及或而且很有在')
+CJK_RUN = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]+')
+LATIN_WORD = re.compile(r'[A-Za-z0-9]{2,}')
+
+
+def aggregate_rows(df):
+    """把一批長表列（含 _row_no）彙總成 (機器代碼, 區塊, 項目) 的計數，以及帶列號的非空 Note。"""
+    score = pd.to_numeric(df['分數'], errors='coerce')
+    stats = df[STATS_KEYS].assign(
+        pass_count=df['Pass/NG'].eq('Pass').astype(int),
+        ng_count=df['Pass/NG'].eq('NG').astype(int),
+        score_sum=score.fillna(0),
+        score_count=score.notna().astype(int),
+        row_count=1
+    ).groupby(STATS_KEYS, sort=False).sum().reset_index()
+    notes = df[STATS_KEYS + ['Pass/NG', '測試者', 'Note']].assign(row_no=df['_row_no'])
+    notes = notes[notes['Note'] != '']
+    return stats, notes
+
+
+def note_terms(text):
+    """把 Note 切成索引詞與出現次數：中文取相鄰兩字（bigram），英數取整個字並轉小寫。
+
+    不需要中文斷詞字典，繁體與簡體都適用；只有一個中文字的片段保留單字。
+    """
+    terms = Counter()
+    for run in CJK_RUN.findall(text):
+        if len(run) == 1 and run not in TERM_STOP_CHARS:
+            terms[run] += 1
+        for i in range(len(run) - 1):
+            gram = run[i:i + 2]
+            if not TERM_STOP_CHARS.intersection(gram):
+                terms[gram] += 1
+    terms.update(word.lower() for word in LATIN_WORD.findall(text))
+    return terms
+
+
+def like_pattern(keyword):
+    """LIKE 的「包含」樣式；keyword 中的 %、_ 與跳脫字元本身都當一般字元比對（搭配 ESCAPE '\\'）。"""
+    escaped = keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def index_notes(conn, notes):
+    """把一批 Note（含 row_no、機器代碼、區塊、項目、Note）斷詞後寫入詞索引，並累加每個項目的詞頻。"""
+    postings = []
+    counts = Counter()
+    for row_no, machine, section, item, note in notes[['row_no'] + STATS_KEYS + ['Note']].itertuples(index=False, name=None):
+        for term, tf in note_terms(note).items():
+            postings.append((term, row_no, tf))
+            counts[(machine, section, item, term)] += tf
+    conn.executemany('INSERT OR REPLACE INTO note_terms VALUES (?, ?, ?)', postings)
+    conn.executemany(
+        'INSERT INTO term_counts VALUES (?, ?, ?, ?, ?)'
+        ' ON CONFLICT (machine, section, item, term) DO UPDATE SET count = count + excluded.count',
+        [(*key, count) for key, count in counts.items()]
+    )
+
+
+def mirror_records(df):
+    """把工作表的字串列轉成鏡像資料表的型別（分數為數字、日期時間為固定格式）。"""
+    typed = pd.DataFrame({
+        MIRROR_COLUMNS[col]: df[col] if col in df.columns else ''
+        for col in MIRROR_COLUMNS
+    })
+    typed['score'] = pd.to_numeric(typed['score'], errors='coerce')
+    typed['ts'] = pd.to_datetime(typed['ts'], errors='coerce').dt.strftime(TIMESTAMP_FORMAT)
+    typed.insert(0, 'row_no', df['_row_no'].to_numpy())
+    return typed.astype(object).where(typed.notna(), None).to_dict('records')
+
+
+def filter_clause(filters):
+    """把分析篩選條件轉成 SQL WHERE 子句。
+
+    filters 可含 start／end（date，含當天）、machines、testers（list）；缺少或為 None 表示不篩選。
+    """
+    clauses = ['1 = 1']
+    params = []
+    if filters.get('start'):
+        clauses.append('ts >= ?')
+        params.append(filters['start'].strftime('%Y-%m-%d'))
+    if filters.get('end'):
+        clauses.append('ts < ?')
+        params.append((filters['end'] + timedelta(days=1)).strftime('%Y-%m-%d'))
+    for key, column in (('machines', 'machine'), ('testers', 'tester')):
+        values = filters.get(key)
+        if values is not None:
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})" if values else '0 = 1')
+            params.extend(values)
+    return ' AND '.join(clauses), params
+
+
+class AnalysisStore:
+    """工作表1 的本機 SQLite 鏡像，以及每個 (機器代碼, 區塊, 項目) 的累計統計。
+
+    update_from() 只套用快照中尚未處理的列，鏡像與統計在同一個交易內更新；
+    分析工具直接讀取這裡的資料，不必每次都向 Google Sheet 讀取與重新轉型。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # 每次有新資料寫入鏡像或 rebuild 就加 1；同一個 server process 內的所有 session 共用，
+        # 用來判斷畫面是否需要更新，也加進各頁快取的 data_key
+        self.version = 0
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sheet_rows ('
+                ' row_no INTEGER PRIMARY KEY, tester TEXT, machine TEXT, section TEXT, item TEXT,'
+                ' result TEXT, note TEXT, score REAL, ts TEXT, submission_id TEXT)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_sheet_rows_ts ON sheet_rows (ts)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_sheet_rows_machine_ts ON sheet_rows (machine, ts)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_sheet_rows_tester ON sheet_rows (tester)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS item_stats ('
+                ' machine TEXT NOT NULL, section TEXT NOT NULL, item TEXT NOT NULL,'
+                ' pass_count INTEGER NOT NULL, ng_count INTEGER NOT NULL,'
+                ' score_sum REAL NOT NULL, score_count INTEGER NOT NULL, row_count INTEGER NOT NULL,'
+                ' PRIMARY KEY (machine, section, item))'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS item_notes ('
+                ' row_no INTEGER PRIMARY KEY, machine TEXT NOT NULL, section TEXT NOT NULL,'
+                ' item TEXT NOT NULL, result TEXT NOT NULL, tester TEXT NOT NULL, note TEXT NOT NULL)'
+            )
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS note_terms ('
+                ' term TEXT NOT NULL, row_no INTEGER NOT NULL, tf INTEGER NOT NULL,'
+                ' PRIMARY KEY (term, row_no)) WITHOUT ROWID'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS term_counts ('
+                ' machine TEXT NOT NULL, section TEXT NOT NULL, item TEXT NOT NULL, term TEXT NOT NULL,'
+                ' count INTEGER NOT NULL, PRIMARY KEY (machine, section, item, term))'
+            )
+            if not conn.execute('SELECT 1 FROM meta WHERE key = ?', (NOTE_INDEX_KEY,)).fetchone():
+                notes = pd.read_sql_query(
+                    'SELECT row_no, machine AS 機器代碼, section AS 區塊, item AS 項目, note AS Note FROM item_notes',
+                    conn
+                )
+                index_notes(conn, notes)
+                conn.execute('INSERT INTO meta VALUES (?, 1)', (NOTE_INDEX_KEY,))
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def row_count(self, layout='long'):
+        """某個來源工作表已處理的列數。"""
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT value FROM meta WHERE key = ?', (ROW_COUNT_KEYS[layout],)).fetchone()
+        return row[0] if row else 0
+
+    def row_counts(self):
+        """各來源工作表已處理的列數，可當作「上次看到哪裡」的標記。"""
+        return {layout: self.row_count(layout) for layout in ROW_COUNT_KEYS}
+
+    def count_new_submissions(self, marks):
+        """marks（row_counts() 的結果）之後新增的評估台次與不同機器數。"""
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT COUNT(DISTINCT tester || '|' || machine || '|' || ts), COUNT(DISTINCT machine) FROM sheet_rows"
+                ' WHERE (row_no >= ? AND row_no < ?) OR row_no >= ?',
+                (marks['long'], WIDE_ROW_OFFSET, WIDE_ROW_OFFSET + marks['wide'] * WIDE_ROW_STRIDE)
+            ).fetchone()
+
+    def mirror_size(self):
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT COUNT(*) FROM sheet_rows').fetchone()[0]
+
+    def update_from(self, snap):
+        """套用快照中新增的列；回傳 False 表示快照列數比已處理的少（工作表被刪列），需要 rebuild。"""
+        with self.lock:
+            if not snap.header:
+                return True
+            done = self.row_count(snap.layout)
+            # 其他 session 可能同時在同步／append，只處理這裡讀到的列數，並只記錄實際處理到的位置
+            with snap.lock:
+                total = len(snap.rows)
+            if total < done:
+                return False
+            if total == done:
+                return True
+            delta = snap.long_frame(start=done, stop=total)
+            stats, notes = aggregate_rows(delta)
+            with closing(self._connect()) as conn, conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO sheet_rows VALUES (:row_no, :tester, :machine, :section, :item,'
+                    ' :result, :note, :score, :ts, :submission_id)',
+                    mirror_records(delta)
+                )
+                conn.executemany(
+                    'INSERT INTO item_stats VALUES (:機器代碼, :區塊, :項目, :pass_count, :ng_count,'
+                    ' :score_sum, :score_count, :row_count)'
+                    ' ON CONFLICT (machine, section, item) DO UPDATE SET'
+                    ' pass_count = pass_count + excluded.pass_count,'
+                    ' ng_count = ng_count + excluded.ng_count,'
+                    ' score_sum = score_sum + excluded.score_sum,'
+                    ' score_count = score_count + excluded.score_count,'
+                    ' row_count = row_count + excluded.row_count',
+                    stats.to_dict('records')
+                )
+                conn.executemany(
+                    'INSERT OR REPLACE INTO item_notes VALUES (:row_no, :機器代碼, :區塊, :項目, :result, :測試者, :Note)',
+                    notes.rename(columns={'Pass/NG': 'result'}).to_dict('records')
+                )
+                index_notes(conn, notes)
+                conn.execute(
+                    'INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                    (ROW_COUNT_KEYS[snap.layout], total)
+                )
+            self.version += 1
+            return True
+
+    def update_all(self, snaps):
+        return all([self.update_from(snap) for snap in snaps])
+
+    def rebuild(self, snaps):
+        """清空鏡像與統計，從 Google Sheet 重新讀取並重新計算全部資料。"""
+        with self.lock:
+            with closing(self._connect()) as conn, conn:
+                conn.execute('DELETE FROM sheet_rows')
+                conn.execute('DELETE FROM item_stats')
+                conn.execute('DELETE FROM item_notes')
+                conn.execute('DELETE FROM note_terms')
+                conn.execute('DELETE FROM term_counts')
+                conn.execute('DELETE FROM meta')
+                conn.execute('INSERT INTO meta VALUES (?, 1)', (NOTE_INDEX_KEY,))
+            # 重建後即使資料與快照指紋都沒變，也要讓既有的快取失效
+            self.version += 1
+        for snap in snaps:
+            snap.invalidate()
+            snap.sync()
+        return self.update_all(snaps)
+
+    def load(self, filters=None):
+        """讀取統計與 Note；有 filters 時直接在鏡像上以 SQL 篩選後彙總，只掃描符合條件的列。"""
+        if filters:
+            return self._load_filtered(filters)
+        with closing(self._connect()) as conn:
+            stats = pd.read_sql_query(
+                'SELECT machine AS 機器代碼, section AS 區塊, item AS 項目, pass_count, ng_count,'
+                ' score_sum, score_count, row_count FROM item_stats',
+                conn
+            )
+            notes = pd.read_sql_query(
+                'SELECT row_no, machine AS 機器代碼, section AS 區塊, item AS 項目,'
+                ' result AS "Pass/NG", tester AS 測試者, note AS Note FROM item_notes ORDER BY row_no',
+                conn
+            )
+        return stats, notes
+
+    def _load_filtered(self, filters):
+        where, params = filter_clause(filters)
+        with closing(self._connect()) as conn:
+            stats = pd.read_sql_query(
+                'SELECT machine AS 機器代碼, section AS 區塊, item AS 項目,'
+                " SUM(result = 'Pass') AS pass_count, SUM(result = 'NG') AS ng_count,"
+                ' COALESCE(SUM(score), 0) AS score_sum, COUNT(score) AS score_count, COUNT(*) AS row_count'
+                f' FROM sheet_rows WHERE {where} GROUP BY machine, section, item',
+                conn, params=params
+            )
+            notes = pd.read_sql_query(
+                'SELECT row_no, machine AS 機器代碼, section AS 區塊, item AS 項目,'
+                ' result AS "Pass/NG", tester AS 測試者, note AS Note'
+                f" FROM sheet_rows WHERE {where} AND note != '' ORDER BY row_no",
+                conn, params=params
+            )
+        return stats, notes
+
+    def count_rows(self, filters=None):
+        where, params = filter_clause(filters or {})
+        with closing(self._connect()) as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM sheet_rows WHERE {where}', params).fetchone()[0]
+
+    def filter_options(self):
+        """篩選器可用的選項：所有測試者，以及資料的最早／最晚日期時間。"""
+        with closing(self._connect()) as conn:
+            testers = [r[0] for r in conn.execute('SELECT DISTINCT tester FROM sheet_rows ORDER BY tester')]
+            first_ts, last_ts = conn.execute('SELECT MIN(ts), MAX(ts) FROM sheet_rows').fetchone()
+        return testers, first_ts, last_ts
+
+    def term_frequencies(self, machines=None, section=None, limit=30):
+        """Note 中最常出現的詞，直接由累計詞頻表讀取，不重新斷詞。"""
+        clauses = ['1 = 1']
+        params = []
+        if machines is not None:
+            clauses.append(f"machine IN ({', '.join('?' * len(machines))})")
+            params.extend(machines)
+        if section is not None:
+            clauses.append('section = ?')
+            params.append(section)
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                f'SELECT term AS 詞, SUM(count) AS 次數 FROM term_counts WHERE {" AND ".join(clauses)}'
+                ' GROUP BY term ORDER BY 次數 DESC, term LIMIT ?',
+                conn, params=params + [limit]
+            )
+
+    def search_notes(self, query, filters=None, section=None, limit=200):
+        """找出含有所有關鍵字（以空白分隔）的 Note，最新的在前；中文先以詞索引縮小範圍，再以 LIKE 確認每個關鍵字都完整出現。"""
+        keywords = query.split()
+        where, params = filter_clause(filters or {})
+        if section is not None:
+            where += ' AND section = ?'
+            params.append(section)
+        # 只用中文兩字組預先篩選：單一中文字只有單字片段才會被索引，
+        # 英數字以整個字索引，"abc" 找不到 "abc123"，這兩種都只靠 LIKE 比對子字串
+        terms = [term for term in note_terms(' '.join(keywords)) if len(term) == 2 and CJK_RUN.fullmatch(term)]
+        if terms:
+            where += (
+                f" AND row_no IN (SELECT row_no FROM note_terms WHERE term IN ({', '.join('?' * len(terms))})"
+                ' GROUP BY row_no HAVING COUNT(*) = ?)'
+            )
+            params += terms + [len(terms)]
+        else:
+            where += " AND note != ''"
+        where += " AND note LIKE ? ESCAPE '\\'" * len(keywords)
+        params += [like_pattern(k) for k in keywords]
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                'SELECT ts AS 日期時間, tester AS 測試者, machine AS 機器代碼, section AS 區塊, item AS 項目,'
+                f' result AS "Pass/NG", note AS Note FROM sheet_rows WHERE {where} ORDER BY row_no DESC LIMIT ?',
+                conn, params=params + [limit]
+            )
+
+    def load_rows(self):
+        """讀取鏡像中的原始列：類別欄位為 category、分數為 float、日期時間為 datetime。"""
+        columns = ', '.join(f'{db_col} AS "{col}"' for col, db_col in MIRROR_COLUMNS.items())
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(f'SELECT {columns} FROM sheet_rows ORDER BY row_no', conn)
+        df[CATEGORY_COLUMNS] = df[CATEGORY_COLUMNS].astype('category')
+        df['日期時間'] = pd.to_datetime(df['日期時間'], format=TIMESTAMP_FORMAT)
+        return df
+
+
+@st.cache_resource
+def get_analysis_store():
+    return AnalysisStore(ANALYSIS_STORE_PATH)
@@ -0,0 +1,67 @@
+import plotly.express as px
+import streamlit as st
+
+from config import EVALUATION_SECTIONS, MACHINE_CODES_ALL
+from perf_trace import span
+
+
+TERM_CHART_TOP = 30  # 詞頻圖顯示前幾個詞
+NOTE_SEARCH_LIMIT = 200  # 搜尋結果最多顯示幾筆
+NOTE_SECTIONS = list(EVALUATION_SECTIONS.keys()) + ['Fibo問題追蹤']
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def term_figure(data_key, machine, section, _terms):
+    """詞頻長條圖，依 (data_key, 機器, 區塊) 快取。"""
+    fig = px.bar(
+        _terms,
+        x='次數',
+        y='詞',
+        orientation='h',
+        title=f'💬 {machine}｜{section} 備註常見詞',
+        color='次數',
+        color_continuous_scale='Blues'
+    )
+    fig.update_layout(
+        yaxis=dict(categoryorder='total ascending', automargin=True),
+        height=max(300, 24 * len(_terms) + 120)
+    )
+    return fig
+
+
+def render(snapshots, analysis_store):
+    st.markdown('### 📝 備註分析')
+    try:
+        for snapshot in snapshots:
+            snapshot.sync()
+        with span('更新本機統計'):
+            analysis_store.update_all(snapshots)
+    except Exception as e:
+        st.error(f"❌ Google Sheet 讀取失敗：{e}")
+        st.stop()
+
+    col1, col2 = st.columns(2)
+    with col1:
+        machine = st.selectbox('機器', ['全部機器'] + MACHINE_CODES_ALL, key='notes_machine')
+    with col2:
+        section = st.selectbox('區塊', ['全部區塊'] + NOTE_SECTIONS, key='notes_section')
+    machines = None if machine == '全部機器' else [machine]
+    section_filter = None if section == '全部區塊' else section
+
+    # 詞頻來自累計的詞索引，不會重新斷詞整個歷史
+    with span('備註詞頻'):
+        terms = analysis_store.term_frequencies(machines, section_filter, TERM_CHART_TOP)
+        if terms.empty:
+            st.info('目前範圍內沒有備註')
+        else:
+            data_key = (tuple(snapshot.fingerprint() for snapshot in snapshots), analysis_store.version)
+            st.plotly_chart(term_figure(data_key, machine, section, terms))
+
+    query = st.text_input('🔍 搜尋備註（多個關鍵字以空白分隔）', key='notes_query')
+    if query.strip():
+        with span('備註搜尋'):
+            results = analysis_store.search_notes(
+                query, {'machines': machines} if machines else None, section_filter, NOTE_SEARCH_LIMIT
+            )
+        st.write(f'找到 {len(results)} 筆（最多顯示 {NOTE_SEARCH_LIMIT} 筆，最新的在前）')
+        st.dataframe(results, hide_index=True)
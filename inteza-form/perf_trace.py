@@ -0,0 +1,165 @@
+import contextvars
+import csv
+import io
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+
+# ===== 效能紀錄 =====
+# 每次 rerun 記錄各階段耗時與 Google Sheet API 的呼叫次數／傳輸量，網址加上 ?debug=1 時在側邊欄顯示
+TRACE_HISTORY = 50  # 每個 session 保留最近幾次 rerun
+TRACE_CSV_COLUMNS = [
+    'session_id', 'tester', 'rerun', 'started_at', 'page', 'span', 'depth',
+    'start_ms', 'duration_ms', 'api_calls', 'bytes_sent', 'bytes_received'
+]
+
+# 目前執行緒正在記錄的 rerun；背景上傳執行緒沒有 rerun，API 呼叫不會被記錄
+_current_trace = contextvars.ContextVar('perf_trace', default=None)
+
+
+class RerunTrace:
+    """一次 rerun 的紀錄；span 依開始順序排列，巢狀 span 的 API 統計會同時計入外層。"""
+
+    def __init__(self, session_id, rerun, history):
+        self.session_id = session_id
+        self.rerun = rerun
+        self.history = history
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.duration_ms = None
+        self.tags = {}
+        self.spans = []
+        self.stack = []
+        self.totals = {'api_calls': 0, 'bytes_sent': 0, 'bytes_received': 0}
+
+    def to_dict(self):
+        return {
+            'session_id': self.session_id,
+            'rerun': self.rerun,
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'duration_ms': self.duration_ms,
+            **self.tags,
+            **self.totals,
+            'spans': self.spans
+        }
+
+
+def begin_rerun():
+    if 'perf_session_id' not in st.session_state:
+        st.session_state.perf_session_id = uuid.uuid4().hex[:8]
+        st.session_state.perf_rerun = 0
+        st.session_state.perf_history = []
+    st.session_state.perf_rerun += 1
+    trace = RerunTrace(st.session_state.perf_session_id, st.session_state.perf_rerun, st.session_state.perf_history)
+    _current_trace.set(trace)
+    return trace
+
+
+def finish_rerun(trace):
+    """結束記錄並加入 session 的歷史。
+
+    st.stop／st.rerun 中斷時也會在 finally 中呼叫，此時不能再呼叫任何 st 指令，
+    因此歷史清單在 begin_rerun 時就先從 session state 取出。
+    """
+    trace.duration_ms = round((time.perf_counter() - trace.start) * 1000, 1)
+    _current_trace.set(None)
+    trace.history.append(trace.to_dict())
+    del trace.history[:-TRACE_HISTORY]
+
+
+@contextmanager
+def span(name):
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    entry = {
+        'span': name,
+        'depth': len(trace.stack),
+        'start_ms': round((time.perf_counter() - trace.start) * 1000, 1),
+        'duration_ms': None,
+        'api_calls': 0,
+        'bytes_sent': 0,
+        'bytes_received': 0
+    }
+    trace.spans.append(entry)
+    trace.stack.append(entry)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        entry['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        trace.stack.pop()
+
+
+def record_api_call(bytes_sent, bytes_received):
+    """由 Google Sheet 的 HTTP client 在每次 API 呼叫後呼叫。"""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    for counts in [trace.totals] + trace.stack:
+        counts['api_calls'] += 1
+        counts['bytes_sent'] += bytes_sent
+        counts['bytes_received'] += bytes_received
+
+
+def trace_rows(history):
+    """攤平成一個 span 一列，方便把多位測試者一整天的紀錄合併分析。"""
+    for trace in history:
+        base = {key: trace.get(key) for key in ('session_id', 'tester', 'rerun', 'started_at', 'page')}
+        yield {**base, 'span': '（整次 rerun）', 'depth': -1, 'start_ms': 0, 'duration_ms': trace['duration_ms'],
+               'api_calls': trace['api_calls'], 'bytes_sent': trace['bytes_sent'],
+               'bytes_received': trace['bytes_received']}
+        for entry in trace['spans']:
+            yield {**base, **entry}
+
+
+def trace_csv(history):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=TRACE_CSV_COLUMNS)
+    writer.writeheader()
+    writer.writerows(trace_rows(history))
+    return output.getvalue().encode('utf-8-sig')
+
+
+def render_panel():
+    """側邊欄的效能紀錄面板，只有網址帶 ?debug=1 時顯示；內容為本 session 已完成的 rerun。"""
+    if st.query_params.get('debug') != '1':
+        return
+    history = st.session_state.get('perf_history', [])
+    with st.sidebar.expander('🛠️ 效能紀錄', expanded=True):
+        if not history:
+            st.write('尚無紀錄')
+            return
+        last = history[-1]
+        st.write(
+            f"上一次 rerun：{last['duration_ms']:.0f} ms｜API {last['api_calls']} 次"
+            f"｜↑ {last['bytes_sent'] / 1024:.1f} KB｜↓ {last['bytes_received'] / 1024:.1f} KB"
+        )
+        spans = pd.DataFrame(last['spans'], columns=TRACE_CSV_COLUMNS[5:])
+        spans['span'] = ['　' * d + name for d, name in zip(spans['depth'], spans['span'])]
+        st.dataframe(spans.drop(columns='depth'), hide_index=True)
+        st.line_chart(pd.DataFrame(history).set_index('rerun')['duration_ms'], height=150)
+
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        session_id = st.session_state.perf_session_id
+        st.download_button(
+            '⬇️ 匯出 JSON',
+            json.dumps(history, ensure_ascii=False, indent=2),
+            file_name=f'perf_trace_{session_id}_{stamp}.json',
+            mime='application/json',
+            key='perf_export_json'
+        )
+        st.download_button(
+            '⬇️ 匯出 CSV',
+            trace_csv(history),
+            file_name=f'perf_trace_{session_id}_{stamp}.csv',
+            mime='text/csv',
+            key='perf_export_csv'
+        )
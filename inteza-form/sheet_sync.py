@@ -0,0 +1,282 @@
+import random
+import threading
+import time
+
+import gspread
+import pandas as pd
+import streamlit as st
+from google.oauth2.service_account import Credentials
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+
+from config import (
+    ANALYSIS_SHEET_NAME, SHEET_COLUMNS, SHEET_ID, SHEET_NAME, STORAGE_MODE, SUBMISSION_ID_COLUMN, WIDE_SHEET_NAME, scope
+)
+from perf_trace import record_api_call, span
+from wide_format import records_to_wide, wide_columns, wide_to_long
+
+
+# ===== 初始化 Google Sheet 客戶端 =====
+API_MAX_ATTEMPTS = 4  # 一次呼叫最多送出幾次（含第一次）
+API_RETRY_DEADLINE = 15  # 秒；一次呼叫的重試最多等多久，超過就直接拋出錯誤
+API_BACKOFF_BASE = 1  # 秒；第 n 次重試前等待 BASE * 2^(n-1) 秒，再乘上 0.5～1 的隨機值
+API_REQUEST_TIMEOUT = 30  # 秒；單一 HTTP 請求的逾時
+
+
+class TracedHTTPClient(gspread.HTTPClient):
+    """gspread 的 HTTP client，加上有上限的重試與效能紀錄。
+
+    遇到 408／429／5xx 以指數退避重試；次數與等待時間都有上限，重試計數只存在這次呼叫中，
+    所有 session 與背景上傳執行緒共用同一個 client 也互不影響。
+    values:append 不是冪等的：408／5xx 時伺服器可能已經寫入，因此只在 429（請求未被處理）時重試，
+    其餘由 append_submissions 重新同步後再依提交ID 判斷是否需要重寫。
+    每個實際送出的 HTTP 請求（含重試）都會記錄送出／收到的位元組數。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session.hooks['response'].append(self._record_response)
+
+    @staticmethod
+    def _retryable(endpoint, code):
+        if endpoint.endswith(':append'):
+            return code == 429
+        return code in (408, 429) or code >= 500
+
+    def request(self, method, endpoint, *args, **kwargs):
+        deadline = time.monotonic() + API_RETRY_DEADLINE
+        for attempt in range(1, API_MAX_ATTEMPTS + 1):
+            try:
+                return super().request(method, endpoint, *args, **kwargs)
+            except gspread.exceptions.APIError as err:
+                wait = API_BACKOFF_BASE * 2 ** (attempt - 1) * random.uniform(0.5, 1)
+                if (attempt == API_MAX_ATTEMPTS or not self._retryable(endpoint, err.code)
+                        or time.monotonic() + wait > deadline):
+                    raise
+                time.sleep(wait)
+
+    @staticmethod
+    def _record_response(response, *args, **kwargs):
+        body = response.request.body or b''
+        record_api_call(len(body.encode() if isinstance(body, str) else body), len(response.content))
+
+
+@st.cache_resource
+def get_sheet_handles():
+    """每個 server process 只授權一次並共用同一組 client／工作表物件。
+
+    gspread 的 AuthorizedSession 會重用 HTTP 連線並自動更新 token；
+    TracedHTTPClient 遇到 429／5xx 會以有上限的指數退避重試。
+    """
+    credentials = Credentials.from_service_account_info(st.secrets['gcp_service_account'], scopes=scope)
+    gc = gspread.authorize(credentials, http_client=TracedHTTPClient)
+    gc.set_timeout(API_REQUEST_TIMEOUT)
+    sh = gc.open_by_key(SHEET_ID)
+    # 一次取得所有工作表的 metadata，避免每個工作表各打一次 API
+    sheets = {ws.title: ws for ws in sh.worksheets()}
+    if SHEET_NAME not in sheets:
+        raise gspread.WorksheetNotFound(SHEET_NAME)
+    if STORAGE_MODE == 'wide' and WIDE_SHEET_NAME not in sheets:
+        sheets[WIDE_SHEET_NAME] = sh.add_worksheet(WIDE_SHEET_NAME, rows=1000, cols=len(wide_columns()))
+    return gc, sh, sheets[SHEET_NAME], sheets.get(ANALYSIS_SHEET_NAME), sheets.get(WIDE_SHEET_NAME)
+
+
+# ===== 工作表1 共用快取 =====
+SNAPSHOT_SYNC_INTERVAL = 30  # 秒；同一個 server process 內最多每 30 秒向 Google Sheet 增量同步一次
+
+
+class SheetSnapshot:
+    """工作表的 process 共用快照，所有 session 共用，只讀取上次同步後新增的列。
+
+    layout 為 'long'（工作表1，每題一列）或 'wide'（每台機器一列）。
+    lock 只保護記憶體中的資料，讀取 Google Sheet 時不持有，其他 session 讀取快照不會被網路卡住；
+    sync_lock 讓同一時間只有一個同步在讀取。
+    """
+
+    def __init__(self, ws, layout='long'):
+        self.ws = ws
+        self.layout = layout
+        self.columns = SHEET_COLUMNS if layout == 'long' else wide_columns()
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.generation = 0  # invalidate() 時加 1，讀取期間被清空的結果就丟棄
+        self.header = []
+        self.rows = []
+        self.submission_ids = set()
+        self.last_sync = 0.0
+        # append 結果不明（失敗或沒有回應）時設為 True，下次 append 前必須先成功強制同步
+        self.needs_resync = False
+
+    def _pad(self, row):
+        row = list(row)
+        return row + [''] * (len(self.header) - len(row))
+
+    def _last_col(self):
+        return rowcol_to_a1(1, len(self.header)).rstrip('1')
+
+    def _extend(self, rows):
+        rows = [self._pad(r) for r in rows]
+        self.rows.extend(rows)
+        if SUBMISSION_ID_COLUMN in self.header:
+            idx = self.header.index(SUBMISSION_ID_COLUMN)
+            self.submission_ids.update(r[idx] for r in rows if r[idx])
+
+    def _stale(self):
+        return time.time() - self.last_sync >= SNAPSHOT_SYNC_INTERVAL
+
+    def sync(self, force=False):
+        """增量同步；非 force 時若已有其他同步正在讀取，直接沿用目前的快照，不排隊等待。"""
+        if not force and not self._stale():
+            return
+        if not self.sync_lock.acquire(blocking=force):
+            return
+        try:
+            if not force and not self._stale():
+                return
+            with self.lock:
+                generation = self.generation
+                full = not self.header
+                # 只讀取目前快照之後的列（第 1 列為 header）
+                start_row = len(self.rows) + 2
+                last_col = None if full else self._last_col()
+            with span(f'讀取 Google Sheet（{self.layout}）'):
+                if full:
+                    values = self.ws.get_all_values()
+                else:
+                    values = self.ws.get(f'A{start_row}:{last_col}')
+            with self.lock:
+                if generation != self.generation:
+                    return  # 讀取期間被 invalidate()，下次再完整讀取
+                if full:
+                    self.header = values[0] if values else []
+                    self.rows = []
+                    self.submission_ids = set()
+                    self._extend(values[1:])
+                else:
+                    # 讀取期間 append_local 可能已經加入前面幾列
+                    self._extend(values[len(self.rows) + 2 - start_row:])
+                self.last_sync = time.time()
+        finally:
+            self.sync_lock.release()
+
+    def ensure_columns(self):
+        """確保工作表 header 含有 self.columns 的所有欄位（舊表單會缺少 提交ID、題目增加時寬表會缺欄）。"""
+        if not self.header:
+            self.sync(force=True)
+        with self.lock:
+            if not self.header:
+                self._ensure_width(len(self.columns))
+                self.ws.update([self.columns], 'A1')
+                self.header = list(self.columns)
+                return
+            missing = [c for c in self.columns if c not in self.header]
+            if missing:
+                self._ensure_width(len(self.header) + len(missing))
+                start_col = rowcol_to_a1(1, len(self.header) + 1)
+                self.ws.update([missing], start_col)
+                self.header = self.header + missing
+                self.rows = [self._pad(r) for r in self.rows]
+
+    def _ensure_width(self, n_cols):
+        """工作表的欄數不足 n_cols 時先加欄，否則寫入超出格線的範圍會被 API 拒絕。"""
+        if self.ws.col_count < n_cols:
+            self.ws.add_cols(n_cols - self.ws.col_count)
+
+    def has_submission(self, submission_id):
+        with self.lock:
+            return submission_id in self.submission_ids
+
+    def append_local(self, start_row, values):
+        """本 app 寫入後直接更新快照；若寫入位置與快照不連續則下次強制同步。"""
+        with self.lock:
+            if self.header and start_row == len(self.rows) + 2:
+                self._extend(['' if v is None else str(v) for v in r] for r in values)
+            else:
+                self.last_sync = 0.0
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.header = []
+            self.rows = []
+            self.submission_ids = set()
+            self.last_sync = 0.0
+
+    def fingerprint(self):
+        """(列數, 最後一筆 日期時間)，資料有變動時就會改變。"""
+        with self.lock:
+            if not self.rows or '日期時間' not in self.header:
+                return (len(self.rows), None)
+            return (len(self.rows), self.rows[-1][self.header.index('日期時間')])
+
+    def frame_columns(self):
+        """DataFrame 使用的欄名：空白的 header 改為 Unnamed_{i}。"""
+        return [col if col != '' else f'Unnamed_{i}' for i, col in enumerate(self.header)]
+
+    def frame(self, start=0, stop=None):
+        with self.lock:
+            return pd.DataFrame([list(r) for r in self.rows[start:stop]], columns=self.frame_columns())
+
+    def long_frame(self, start=0, stop=None):
+        """第 start 到 stop 列的資料，一律以長表欄位回傳，並附上全域排序用的 _row_no。"""
+        df = self.frame(start, stop)
+        if self.layout == 'wide':
+            return wide_to_long(df, start_row=start)
+        return df.assign(_row_no=range(start, start + len(df)))
+
+    def sheet_rows(self, records):
+        """一台機器的 records 依目前 header 順序轉成要 append 的列。"""
+        rows = records if self.layout == 'long' else [records_to_wide(records)]
+        return [['' if r.get(c) is None else r.get(c) for c in self.header] for r in rows]
+
+
+@st.cache_resource
+def get_snapshot():
+    _, _, worksheet, _, _ = get_sheet_handles()
+    return SheetSnapshot(worksheet)
+
+
+@st.cache_resource
+def get_wide_snapshot():
+    _, _, _, _, wide_worksheet = get_sheet_handles()
+    return SheetSnapshot(wide_worksheet, layout='wide') if wide_worksheet else None
+
+
+def get_snapshots():
+    """所有要讀取的資料來源：工作表1，以及存在時的寬表。"""
+    return [snap for snap in (get_snapshot(), get_wide_snapshot()) if snap is not None]
+
+
+def get_write_snapshot():
+    return get_wide_snapshot() if STORAGE_MODE == 'wide' else get_snapshot()
+
+
+def append_submissions(snapshot, batch):
+    """以單一 append 呼叫寫入多台機器的所有列，不需先讀取整張表。
+
+    batch 為 [(提交ID, records), ...]；已寫入過的提交ID（例如重試）會被略過。
+    回傳實際寫入的提交ID 清單。
+    上一次 append 結果不明時，先強制同步確認哪些列已經寫入；同步失敗就直接拋出錯誤，不寫入。
+    """
+    if snapshot.needs_resync:
+        snapshot.sync(force=True)
+        snapshot.needs_resync = False
+    snapshot.ensure_columns()
+    batch = [(sid, records) for sid, records in batch if not snapshot.has_submission(sid)]
+    if not batch:
+        return []
+    values = [row for _, records in batch for row in snapshot.sheet_rows(records)]
+    try:
+        response = snapshot.ws.append_rows(
+            values,
+            value_input_option='USER_ENTERED',
+            insert_data_option='INSERT_ROWS',
+            table_range='A1'
+        )
+    except Exception:
+        # 寫入結果不明（例如逾時／5xx，回應遺失但資料已寫入），下次 append 前必須先同步再依提交ID 判斷
+        snapshot.needs_resync = True
+        raise
+    updated_range = response['updates']['updatedRange'].split('!')[-1]
+    start_row, _ = a1_to_rowcol(updated_range.split(':')[0])
+    snapshot.append_local(start_row, values)
+    return [sid for sid, _ in batch]
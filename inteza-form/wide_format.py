@@ -0,0 +1,87 @@
+import pandas as pd
+
+from config import SHEET_COLUMNS, submission_items
+
+
+# ===== 寬表格式（每台機器一列） =====
+# 題目欄位名稱為「區塊｜項目｜欄位」，欄位為 Pass/NG、Note 或 分數
+WIDE_SCHEMA_VERSION = 1
+WIDE_META_COLUMNS = ['測試者', '機器代碼', '日期時間', '提交ID', '格式版本']
+WIDE_SEP = '｜'
+# 寬表展開後的列號放在長表列號之後：每列寬表最多展開 WIDE_ROW_STRIDE 列
+WIDE_ROW_OFFSET = 1_000_000_000
+WIDE_ROW_STRIDE = 100
+
+
+def wide_column(section, item, field):
+    return WIDE_SEP.join([section, item, field])
+
+
+def wide_columns():
+    """依 submission_items（含所有機器的 Fibo 題目）產生寬表的固定欄位。"""
+    columns = list(WIDE_META_COLUMNS)
+    for section, item, kind, _ in submission_items():
+        if kind == 'score':
+            columns.append(wide_column(section, item, '分數'))
+        elif kind == 'summary':
+            columns.append(wide_column(section, item, 'Note'))
+        else:
+            columns += [wide_column(section, item, 'Pass/NG'), wide_column(section, item, 'Note')]
+    return columns
+
+
+def records_to_wide(records):
+    """把一台機器的長表 records 合成一列寬表（dict，鍵為欄位名稱）。"""
+    first = records[0]
+    row = {
+        '測試者': first['測試者'],
+        '機器代碼': first['機器代碼'],
+        '日期時間': first['日期時間'],
+        '提交ID': first.get('提交ID', ''),
+        '格式版本': WIDE_SCHEMA_VERSION
+    }
+    for r in records:
+        if r['Pass/NG'] != 'N/A':
+            row[wide_column(r['區塊'], r['項目'], 'Pass/NG')] = r['Pass/NG']
+        if r['Note']:
+            row[wide_column(r['區塊'], r['項目'], 'Note')] = r['Note']
+        if r['分數'] is not None:
+            row[wide_column(r['區塊'], r['項目'], '分數')] = r['分數']
+    return row
+
+
+def wide_to_long(wide, start_row=0):
+    """把寬表列展開成長表欄位（SHEET_COLUMNS 加上 _row_no），不屬於該機器的 Fibo 題目會略過。"""
+    groups = {}
+    for col in wide.columns:
+        parts = col.split(WIDE_SEP)
+        if len(parts) == 3:
+            groups.setdefault((parts[0], parts[1]), {})[parts[2]] = col
+
+    def column(fields, field, default):
+        return wide[fields[field]].to_numpy() if field in fields else default
+
+    def meta(col):
+        return wide[col].to_numpy() if col in wide.columns else ''
+
+    frames = []
+    for order, ((section, item), fields) in enumerate(groups.items()):
+        part = pd.DataFrame({
+            '測試者': meta('測試者'),
+            '機器代碼': meta('機器代碼'),
+            '區塊': section,
+            '項目': item,
+            'Pass/NG': column(fields, 'Pass/NG', 'N/A'),
+            'Note': column(fields, 'Note', ''),
+            '分數': column(fields, '分數', ''),
+            '日期時間': meta('日期時間'),
+            '提交ID': meta('提交ID'),
+            '_row_no': [WIDE_ROW_OFFSET + (start_row + i) * WIDE_ROW_STRIDE + order for i in range(len(wide))]
+        })
+        if section == 'Fibo問題追蹤':
+            part = part[(part['Pass/NG'] != '') | (part['Note'] != '')]
+        frames.append(part)
+
+    if not frames:
+        return pd.DataFrame(columns=SHEET_COLUMNS + ['_row_no'])
+    return pd.concat(frames, ignore_index=True).sort_values('_row_no').reset_index(drop=True)
@@ -0,0 +1,117 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import streamlit as st
+
+from local_store import get_analysis_store
+from sheet_sync import append_submissions, get_write_snapshot
+
+
+# ===== 背景寫入佇列 =====
+JOURNAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'submission_journal.db')
+FLUSH_INTERVAL = 5  # 秒；背景執行緒每隔多久嘗試上傳一次
+FLUSH_BATCH_SIZE = 20  # 每次 append 最多合併幾台機器
+FLUSH_RETRY_MAX = 300  # 秒；連續上傳失敗時的最長等待時間
+
+
+class WriteBehindQueue:
+    """以 SQLite journal 暫存提交，背景執行緒批次上傳到 工作表1。
+
+    表單只需寫入本機 journal 即可進入下一台；server 重啟後未上傳的提交會繼續上傳。
+    """
+
+    def __init__(self, path, flush_batch):
+        self.path = path
+        self.flush_batch = flush_batch
+        self.wakeup = threading.Event()
+        self.last_flush = None
+        self.last_error = None
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS submissions ('
+                ' submission_id TEXT PRIMARY KEY,'
+                ' tester TEXT NOT NULL,'
+                ' machine TEXT NOT NULL,'
+                ' payload TEXT NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' flushed_at REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_pending ON submissions (flushed_at, created_at)')
+        self.worker = threading.Thread(target=self._run, name='sheet-write-behind', daemon=True)
+        self.worker.start()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def enqueue(self, records, submission_id):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO submissions (submission_id, tester, machine, payload, created_at)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (submission_id, records[0]['測試者'], records[0]['機器代碼'],
+                 json.dumps(records, ensure_ascii=False), time.time())
+            )
+        self.wakeup.set()
+
+    def depth(self):
+        with closing(self._connect()) as conn, conn:
+            return conn.execute('SELECT COUNT(*) FROM submissions WHERE flushed_at IS NULL').fetchone()[0]
+
+    def records_for(self, tester, since):
+        """取回某測試者自 since（epoch 秒）以來的提交，用於瀏覽器重新整理後還原 session。"""
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute(
+                'SELECT payload FROM submissions WHERE tester = ? AND created_at >= ? ORDER BY created_at',
+                (tester, since)
+            ).fetchall()
+        return [r for (payload,) in rows for r in json.loads(payload)]
+
+    def flush(self):
+        with closing(self._connect()) as conn, conn:
+            pending = conn.execute(
+                'SELECT submission_id, payload FROM submissions WHERE flushed_at IS NULL'
+                ' ORDER BY created_at LIMIT ?',
+                (FLUSH_BATCH_SIZE,)
+            ).fetchall()
+        if not pending:
+            return 0
+        self.flush_batch([(sid, json.loads(payload)) for sid, payload in pending])
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                'UPDATE submissions SET flushed_at = ? WHERE submission_id = ?',
+                [(now, sid) for sid, _ in pending]
+            )
+        self.last_flush = now
+        return len(pending)
+
+    def _run(self):
+        delay = FLUSH_INTERVAL
+        while True:
+            self.wakeup.wait(delay)
+            self.wakeup.clear()
+            try:
+                while self.flush() == FLUSH_BATCH_SIZE:
+                    pass
+                self.last_error = None
+                delay = FLUSH_INTERVAL
+            except Exception as e:
+                self.last_error = str(e)
+                delay = min(delay * 2, FLUSH_RETRY_MAX)
+
+
+@st.cache_resource
+def get_write_queue():
+    analysis_store = get_analysis_store()
+
+    def flush_batch(batch):
+        # 第一次上傳時才連線 Google Sheet；連線失敗由佇列稍後重試，表單不受影響
+        snapshot = get_write_snapshot()
+        append_submissions(snapshot, batch)
+        analysis_store.update_from(snapshot)
+
+    return WriteBehindQueue(JOURNAL_PATH, flush_batch)